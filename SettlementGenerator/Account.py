@@ -1,4 +1,7 @@
 class Account:
+    __slots__ = ('accountID', 'institutionID', 'state', 'cashBalance', 'securities', 'creditLimit',
+                 '_securities_str')
+
     def __init__(self, accountID, institutionID, securities, cashBalance, creditLimit):
         # Extended attributes
         self.accountID = accountID
@@ -7,6 +10,8 @@ class Account:
         self.cashBalance = cashBalance
         self.securities = securities  # Dictionary mapping security type to amount (e.g. {"Bond-A": 10000})
         self.creditLimit = creditLimit
+        # CSV form of the securities ("Bond-A:10000;..."); the generator never changes them afterwards.
+        self._securities_str = ";".join([f"{k}:{v}" for k, v in securities.items()])
 
 
     def __str__(self):
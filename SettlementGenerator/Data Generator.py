@@ -1,28 +1,115 @@
-import csv
-import uuid
+import os
+import sys
 import random
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba is optional; without it the NumPy-vectorized sampler is used.
+    numba = None
 from datetime import datetime, timedelta
 import Account
 import Institution
 import Transaction
 import Instruction
 
+# Interned field values shared by every instruction, so role checks can use identity.
+_CASH = sys.intern("Cash")
+_BOND = sys.intern("Bond")
+_EXISTS = sys.intern("Exists")
+_DUMMY = sys.intern("DUMMY")
+
+# One row of settlement_instructions.csv; the CSV path works on an array of these directly.
+INSTR_DTYPE = np.dtype([
+    ('tx_id', 'U10'), ('uid', 'U6'), ('mother', 'U5'), ('seller_inst', 'U8'), ('buyer_inst', 'U8'),
+    ('from_acct', 'U22'), ('to_acct', 'U22'), ('sec', 'U8'), ('amount', 'U9'), ('is_child', '?'),
+    ('status', 'U6'), ('role', 'U4'), ('link', 'U11'), ('ts_epoch', 'i8'),
+])
 
 
 #helper functions
-def generate_short_id(length=6):
-    """Generate a short hex-based ID (default 6 characters)."""
-    return uuid.uuid4().hex[:length].upper()
+def format_cents(cents):
+    """Format an integer amount of cents as a fixed 2-decimal string (e.g. 123456 -> '1234.56')."""
+    return f"{cents // 100}.{cents % 100:02d}"
 
 #helper function
-def generate_iban():
-    """Generate a simple IBAN-like string.
-    Example: 'DE45' + 16 digits.
+def generate_short_ids(n, length=6):
+    """Generate n short hex-based IDs from a single os.urandom call."""
+    hex_str = os.urandom((n * length + 1) // 2).hex().upper()
+    return [hex_str[i:i + length] for i in range(0, n * length, length)]
+
+#helper function
+def generate_ibans(n):
+    """Generate n IBAN-like strings (e.g. 'DE4512345') in one vectorized draw."""
+    rng = np.random.default_rng(random.getrandbits(32))  # seeded from random, so random.seed() reproduces IDs
+    country_codes = rng.choice(["DE", "FR", "NL", "GB"], n).tolist()
+    check_digits = rng.integers(10, 100, n).tolist()
+    bbans = rng.integers(0, 100000, n).tolist()
+    return [f"{c}{d}{b:05d}" for c, d, b in zip(country_codes, check_digits, bbans)]
+
+
+def _sample_tx_core_numpy(n, account_counts, num_bond_types, t_start_s, duration_s, seed):
+    """Draw the numeric fields of n transactions with vectorized NumPy calls.
+
+    account_counts[i] is the number of accounts of institution i; amounts are whole cents.
+    Returns (amount_cents, cash_ts, bond_ts, seller_idx, buyer_idx, seller_acct_idx,
+    buyer_acct_idx, bond_type_idx).
     """
-    country_code = random.choice(["DE", "FR", "NL", "GB"])
-    check_digits = str(random.randint(10, 99))
-    bban = ''.join(random.choices("0123456789", k=5))
-    return f"{country_code}{check_digits}{bban}"
+    num_institutions = len(account_counts)
+    rng = np.random.default_rng(seed)
+    seller_idx = rng.integers(0, num_institutions, n)
+    # Offset the buyer by 1..num_institutions-1 from the seller: never equal, uniform, no rejection.
+    buyer_idx = (seller_idx + 1 + rng.integers(0, num_institutions - 1, n)) % num_institutions
+    # Account index within each institution, drawn against that institution's account count.
+    seller_acct_idx = rng.integers(0, account_counts[seller_idx])
+    buyer_acct_idx = rng.integers(0, account_counts[buyer_idx])
+    amount_cents = rng.integers(100000, 10000000, n)
+    bond_type_idx = rng.integers(0, num_bond_types, n)
+    # Two independent epoch timestamps (whole seconds) per transaction; sorting each row
+    # ensures cash <= bond, and a tie is bumped by one second so cash < bond.
+    timestamps = t_start_s + np.sort(rng.integers(0, duration_s, (n, 2)), axis=1)
+    cash_ts = timestamps[:, 0]
+    bond_ts = timestamps[:, 1] + (cash_ts == timestamps[:, 1])
+    return amount_cents, cash_ts, bond_ts, seller_idx, buyer_idx, seller_acct_idx, buyer_acct_idx, bond_type_idx
+
+
+def _sample_tx_core_loop(n, account_counts, num_bond_types, t_start_s, duration_s, seed):
+    """Scalar-loop version of _sample_tx_core_numpy, meant to be compiled with numba."""
+    np.random.seed(seed)
+    num_institutions = len(account_counts)
+    amount_cents = np.empty(n, np.int64)
+    cash_ts = np.empty(n, np.int64)
+    bond_ts = np.empty(n, np.int64)
+    seller_idx = np.empty(n, np.int64)
+    buyer_idx = np.empty(n, np.int64)
+    seller_acct_idx = np.empty(n, np.int64)
+    buyer_acct_idx = np.empty(n, np.int64)
+    bond_type_idx = np.empty(n, np.int64)
+    for i in range(n):
+        seller = np.random.randint(0, num_institutions)
+        buyer = (seller + 1 + np.random.randint(0, num_institutions - 1)) % num_institutions
+        seller_idx[i] = seller
+        buyer_idx[i] = buyer
+        seller_acct_idx[i] = np.random.randint(0, account_counts[seller])
+        buyer_acct_idx[i] = np.random.randint(0, account_counts[buyer])
+        amount_cents[i] = np.random.randint(100000, 10000000)
+        bond_type_idx[i] = np.random.randint(0, num_bond_types)
+        t1 = t_start_s + np.random.randint(0, duration_s)
+        t2 = t_start_s + np.random.randint(0, duration_s)
+        if t1 > t2:
+            t1, t2 = t2, t1
+        if t1 == t2:
+            t2 += 1
+        cash_ts[i] = t1
+        bond_ts[i] = t2
+    return amount_cents, cash_ts, bond_ts, seller_idx, buyer_idx, seller_acct_idx, buyer_acct_idx, bond_type_idx
+
+
+if numba is not None:
+    _sample_tx_core = numba.njit(cache=True)(_sample_tx_core_loop)
+else:
+    _sample_tx_core = _sample_tx_core_numpy
 
 class SettlementDataGenerator:
     NUM_INSTITUTIONS = 8
@@ -30,153 +117,191 @@ class SettlementDataGenerator:
     MIN_TOTAL_ACCOUNTS = 6
     MAX_TOTAL_ACCOUNTS = 10
     SIMULATION_DURATION_DAYS = 10
+    CSV_BUFFER_SIZE = 1024 * 1024  # 1 MiB write buffer so each CSV is flushed in a few large writes.
+    CSV_FLUSH_ROWS = 1000          # Rows joined and encoded per write() call.
+    CSV_SPECIAL_CHARS = frozenset(',"\r\n')  # Characters that would require CSV quoting.
 
     def __init__(self):
         self.simulation_start = datetime.now()
         self.institutions = []  # List of Institution objects
         self.accounts = []      # NEW: Master list of all extended Account objects
         self.transactions = []  # List of Transaction objects
-        self.bond_types = ["Bond-A", "Bond-B", "Bond-C", "Bond-D"]
+        self.instruction_rows = None  # INSTR_DTYPE array: even rows are cash legs, odd rows bond legs
+        self.bond_types = [sys.intern(b) for b in ["Bond-A", "Bond-B", "Bond-C", "Bond-D"]]
+        # CSV rows are written without quoting, so no generated field may contain a delimiter.
+        assert not any(SettlementDataGenerator.CSV_SPECIAL_CHARS.intersection(b) for b in self.bond_types)
 
     def generate_institutions(self):
-        for i in range(1, SettlementDataGenerator.NUM_INSTITUTIONS + 1):
+        # Draw the account count per institution first so all IBANs can be generated at once.
+        account_counts = [random.randint(SettlementDataGenerator.MIN_TOTAL_ACCOUNTS,
+                                         SettlementDataGenerator.MAX_TOTAL_ACCOUNTS)
+                          for _ in range(SettlementDataGenerator.NUM_INSTITUTIONS)]
+        account_ids = iter(generate_ibans(sum(account_counts)))
+        # Local aliases: the account loop below then uses LOAD_FAST instead of global/attribute lookups.
+        _random = random.random
+        _choice = random.choice
+        _randint = random.randint
+        _Account = Account.Account
+        bond_types = self.bond_types
+        add_to_accounts = self.accounts.append
+
+        for i, total_accounts in enumerate(account_counts, start=1):
             inst_id = f"INST-{i}"
             institution = Institution.Institution(inst_id, f"Institution {i}")
-            total_accounts = random.randint(SettlementDataGenerator.MIN_TOTAL_ACCOUNTS,
-                                            SettlementDataGenerator.MAX_TOTAL_ACCOUNTS)
 
 
            #create accounts
             for _ in range(total_accounts):
-                accountID = generate_iban()
+                accountID = next(account_ids)
                 # NEW: Random securities assignment (50% chance)
-                if random.random() < 0.5:
-                    sec_type = random.choice(self.bond_types)
-                    securities = {sec_type: random.randint(10000, 50000)}
+                if _random() < 0.5:
+                    sec_type = _choice(bond_types)
+                    securities = {sec_type: _randint(10000, 50000)}
                 else:
                     securities = {}
-                cashBalance = round(random.uniform(5000, 200000), 2)
-                creditLimit = round(random.uniform(100000, 500000), 2)
-                account = Account.Account(accountID, inst_id, securities, cashBalance, creditLimit)
+                # Balances are drawn in whole cents and stored as their fixed 2-decimal string.
+                cashBalance = format_cents(_randint(500000, 20000000))
+                creditLimit = format_cents(_randint(10000000, 50000000))
+                account = _Account(accountID, inst_id, securities, cashBalance, creditLimit)
                 institution.add_account(account)
-                self.accounts.append(account)
+                add_to_accounts(account)
 
 
 
 
             self.institutions.append(institution)
 
-    def random_timestamp(self):
-        simulation_end = self.simulation_start + timedelta(days=SettlementDataGenerator.SIMULATION_DURATION_DAYS)
-        delta = simulation_end - self.simulation_start
-        random_seconds = random.uniform(0, delta.total_seconds())
-        random_time = self.simulation_start + timedelta(seconds=random_seconds)
-        return random_time.isoformat(sep='T', timespec='seconds')
-
     def generate_transactions(self):
-        for _ in range(SettlementDataGenerator.NUM_TRANSACTIONS):
-            seller_inst = random.choice(self.institutions)
-            buyer_inst = random.choice(self.institutions)
-            while buyer_inst == seller_inst:
-                buyer_inst = random.choice(self.institutions)
+        num_transactions = SettlementDataGenerator.NUM_TRANSACTIONS
+        # Per-institution account lists and their sizes, so account picks are plain index draws.
+        institution_accounts = [inst.accounts for inst in self.institutions]
+        account_counts = np.array([len(accounts) for accounts in institution_accounts], dtype=np.int64)
+        total_seconds = int(timedelta(days=SettlementDataGenerator.SIMULATION_DURATION_DAYS).total_seconds())
+        seed = random.getrandbits(32)
 
+        # Draw all numeric fields for every transaction in one compiled (or vectorized) pass.
+        (amount_cents, cash_ts, bond_ts, seller_idx, buyer_idx,
+         seller_acct_idx, buyer_acct_idx, bond_type_idx) = _sample_tx_core(
+            num_transactions, account_counts, len(self.bond_types),
+            int(self.simulation_start.timestamp()), total_seconds, seed)
+        # Four short IDs per transaction: link code, cash leg, bond leg and transaction.
+        short_ids = generate_short_ids(4 * num_transactions)
+        amounts = [format_cents(c) for c in amount_cents.tolist()]
+        link_codes = ["LINK-" + i for i in short_ids[0::4]]
+        cash_ids = short_ids[1::4]
+        bond_ids = short_ids[2::4]
+        transaction_ids = ["TX-" + i for i in short_ids[3::4]]
 
+        # Fill the CSV rows column by column from the sampled arrays.
+        institution_ids = np.array([inst.institution_id for inst in self.institutions])
+        account_ids = np.array([acc.accountID for accounts in institution_accounts for acc in accounts])
+        account_offsets = np.cumsum(account_counts) - account_counts
+        seller_account_ids = account_ids[account_offsets[seller_idx] + seller_acct_idx]
+        buyer_account_ids = account_ids[account_offsets[buyer_idx] + buyer_acct_idx]
+        rows = np.empty(2 * num_transactions, dtype=INSTR_DTYPE)
+        cash_rows, bond_rows = rows[0::2], rows[1::2]
+        for leg_rows in (cash_rows, bond_rows):
+            leg_rows['tx_id'] = transaction_ids
+            leg_rows['mother'] = _DUMMY
+            leg_rows['seller_inst'] = institution_ids[seller_idx]
+            leg_rows['buyer_inst'] = institution_ids[buyer_idx]
+            leg_rows['amount'] = amounts
+            leg_rows['is_child'] = False
+            leg_rows['status'] = _EXISTS
+            leg_rows['link'] = link_codes
+        # Cash leg: buyer sends cash to seller. Bond leg: swapped.
+        cash_rows['uid'], bond_rows['uid'] = cash_ids, bond_ids
+        cash_rows['from_acct'], bond_rows['from_acct'] = buyer_account_ids, seller_account_ids
+        cash_rows['to_acct'], bond_rows['to_acct'] = seller_account_ids, buyer_account_ids
+        cash_rows['sec'], bond_rows['sec'] = _CASH, np.array(self.bond_types)[bond_type_idx]
+        cash_rows['role'], bond_rows['role'] = _CASH, _BOND
+        cash_rows['ts_epoch'], bond_rows['ts_epoch'] = cash_ts, bond_ts
+        self.instruction_rows = rows
+
+        # Materialize the objects from the precomputed arrays (local aliases keep the loop on LOAD_FAST).
+        _Instruction = Instruction.Instruction
+        _Transaction = Transaction.Transaction
+        bond_types = self.bond_types
+        add_transaction = self.transactions.append
+        for (seller_i, buyer_i, seller_acct_i, buyer_acct_i, amount, bond_type_i,
+             cash_timestamp, bond_timestamp, link_code, cash_id, bond_id, transaction_id) in zip(
+                seller_idx.tolist(), buyer_idx.tolist(), seller_acct_idx.tolist(),
+                buyer_acct_idx.tolist(), amounts, bond_type_idx.tolist(),
+                cash_ts.tolist(), bond_ts.tolist(),
+                link_codes, cash_ids, bond_ids, transaction_ids):
             # For bond leg, swap: buyer's "from" and seller's "to" accounts.
-            buyer_account = random.choice(buyer_inst.accounts)
-            seller_account = random.choice(seller_inst.accounts)
-            amount = round(random.uniform(1000, 100000), 2)
-            link_code = "LINK-" + generate_short_id(6)
-
-            # Generate two independent timestamps; ensure cash < bond.
-            t1 = self.random_timestamp()
-            t2 = self.random_timestamp()
-            if t1 >= t2:
-                cash_timestamp, bond_timestamp = t2, t1
-            else:
-                cash_timestamp, bond_timestamp = t1, t2
-            if cash_timestamp == bond_timestamp:
-                bond_timestamp = (datetime.fromisoformat(cash_timestamp) + timedelta(seconds=1)).isoformat(sep='T', timespec='seconds')
-
-            cash_instruction = Instruction.Instruction(
-                unique_id=generate_short_id(6),
-                mother_id="DUMMY",
-                security_type="Cash",
+            buyer_account = institution_accounts[buyer_i][buyer_acct_i]
+            seller_account = institution_accounts[seller_i][seller_acct_i]
+
+            cash_instruction = _Instruction(
+                unique_id=cash_id,
+                mother_id=_DUMMY,
+                security_type=_CASH,
                 amount=amount,
                 is_child=False,
-                status="Exists",
-                role="Cash",
+                status=_EXISTS,
+                role=_CASH,
                 link_code=link_code,
                 from_account=buyer_account,
                 to_account=seller_account,
-                timestamp=cash_timestamp
+                timestamp_epoch=cash_timestamp
             )
-            bond_security = random.choice(self.bond_types)
-            bond_instruction = Instruction.Instruction(
-                unique_id=generate_short_id(6),
-                mother_id="DUMMY",
-                security_type=bond_security,
+            bond_instruction = _Instruction(
+                unique_id=bond_id,
+                mother_id=_DUMMY,
+                security_type=bond_types[bond_type_i],
                 amount=amount,
                 is_child=False,
-                status="Exists",
-                role="Bond",
+                status=_EXISTS,
+                role=_BOND,
                 link_code=link_code,
                 from_account=seller_account,
                 to_account=buyer_account,
-                timestamp=bond_timestamp
+                timestamp_epoch=bond_timestamp
             )
-            transaction_id = "TX-" + generate_short_id(6)
-            transaction = Transaction.Transaction(transaction_id, cash_instruction, bond_instruction)
-            self.transactions.append(transaction)
+            transaction = _Transaction(transaction_id, cash_instruction, bond_instruction)
+            add_transaction(transaction)
+
+    def write_csv_lines(self, filename, header, lines):
+        """Write pre-joined CSV lines as ASCII bytes, CSV_FLUSH_ROWS lines per write.
+
+        Fields are not quoted: IDs are hex/IBAN, amounts are digits and a point, and security
+        types are checked in __init__, so no field contains a delimiter.
+        """
+        with open(filename, mode='wb', buffering=SettlementDataGenerator.CSV_BUFFER_SIZE) as csvfile:
+            csvfile.write((",".join(header) + "\n").encode('ascii'))
+            flush_rows = SettlementDataGenerator.CSV_FLUSH_ROWS
+            for start in range(0, len(lines), flush_rows):
+                chunk = lines[start:start + flush_rows]
+                csvfile.write(("\n".join(chunk) + "\n").encode('ascii'))
 
     def write_instructions_to_csv(self, filename):
-        # Collect and globally sort all instructions by timestamp.
-        instructions = []
-        for tx in self.transactions:
-            instructions.append((tx.transaction_id, tx.cash_instruction))
-            instructions.append((tx.transaction_id, tx.bond_instruction))
-        instructions.sort(key=lambda x: x[1].timestamp)
-        with open(filename, mode='w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                "transactionID", "instructionUniqueID", "motherID",
-                "sellerInstitutionID", "buyerInstitutionID",
-                "fromAccountID", "toAccountID", "securityType",
-                "amount", "isChild", "status", "role", "linkCode", "timestamp"
-            ])
-            for tx_id, instr in instructions:
-                if instr.role == "Cash":
-                    seller_inst_id = instr.to_account.institutionID
-                    buyer_inst_id = instr.from_account.institutionID
-                else:  # Bond leg: swapped
-                    seller_inst_id = instr.from_account.institutionID
-                    buyer_inst_id = instr.to_account.institutionID
-                writer.writerow([
-                    tx_id,
-                    instr.unique_id,
-                    instr.mother_id,
-                    seller_inst_id,
-                    buyer_inst_id,
-                    instr.from_account.accountID,
-                    instr.to_account.accountID,
-                    instr.security_type,
-                    instr.amount,
-                    instr.is_child,
-                    instr.status,
-                    instr.role,
-                    instr.link_code,
-                    instr.timestamp
-                ])
+        # Globally sort all instruction rows by timestamp (stable, so a cash leg stays ahead on ties).
+        rows = self.instruction_rows[np.argsort(self.instruction_rows['ts_epoch'], kind='stable')]
+        header = [
+            "transactionID", "instructionUniqueID", "motherID",
+            "sellerInstitutionID", "buyerInstitutionID",
+            "fromAccountID", "toAccountID", "securityType",
+            "amount", "isChild", "status", "role", "linkCode", "timestamp"
+        ]
+        lines = [
+            f"{tx_id},{uid},{mother},{seller_inst},{buyer_inst},{from_acct},{to_acct},{sec},"
+            f"{amount},{is_child},{status},{role},{link},"
+            f"{datetime.fromtimestamp(ts_epoch).isoformat(sep='T', timespec='seconds')}"
+            for (tx_id, uid, mother, seller_inst, buyer_inst, from_acct, to_acct, sec,
+                 amount, is_child, status, role, link, ts_epoch) in rows.tolist()
+        ]
+        self.write_csv_lines(filename, header, lines)
 
     # ================================
     # NEW: Write Institutions to CSV
     # ================================
     def write_institutions_to_csv(self, filename):
-        with open(filename, mode='w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["institutionID", "name", "Accounts"])
-            for inst in self.institutions:
-                accounts_str = ";".join([acc.accountID for acc in inst.accounts])
-                writer.writerow([inst.institution_id, inst.name, accounts_str])
+        lines = [
+            f"{inst.institution_id},{inst.name},{';'.join([acc.accountID for acc in inst.accounts])}"
+            for inst in self.institutions
+        ]
+        self.write_csv_lines(filename, ["institutionID", "name", "Accounts"], lines)
 
 
 
@@ -185,25 +310,31 @@ class SettlementDataGenerator:
     # NEW: Write Accounts to CSV
     # ================================
     def write_accounts_to_csv(self, filename):
-        with open(filename, mode='w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["accountID", "institutionID", "state", "cashBalance", "securities", "creditLimit"])
-            for acc in self.accounts:
-                # Convert the securities dictionary to a string.
-                securities_str = ";".join([f"{k}:{v}" for k, v in acc.securities.items()])
-                writer.writerow([acc.accountID, acc.institutionID, acc.state, acc.cashBalance, securities_str, acc.creditLimit])
+        # The securities dictionary is serialized once, at account creation.
+        lines = [
+            f"{acc.accountID},{acc.institutionID},{acc.state},{acc.cashBalance},"
+            f"{acc._securities_str},{acc.creditLimit}"
+            for acc in self.accounts
+        ]
+        self.write_csv_lines(filename, ["accountID", "institutionID", "state", "cashBalance", "securities", "creditLimit"], lines)
 
     def run(self):
         print("Generating institutions and accounts...")
         self.generate_institutions()
         print("Generating transactions...")
         self.generate_transactions()
-        print("Writing instructions to CSV file: settlement_instructions.csv")
-        self.write_instructions_to_csv("settlement_instructions.csv")
-        print("Writing institutions to CSV file: institutions.csv")
-        self.write_institutions_to_csv("institutions.csv")
-        print("Writing accounts to CSV file: accounts.csv")
-        self.write_accounts_to_csv("accounts.csv")
+        print("Writing instructions, institutions and accounts to CSV files: "
+              "settlement_instructions.csv, institutions.csv, accounts.csv")
+        # The three files are independent, so their disk writes can overlap.
+        writers = [
+            (self.write_instructions_to_csv, "settlement_instructions.csv"),
+            (self.write_institutions_to_csv, "institutions.csv"),
+            (self.write_accounts_to_csv, "accounts.csv"),
+        ]
+        with ThreadPoolExecutor(max_workers=len(writers)) as executor:
+            futures = [executor.submit(write, filename) for write, filename in writers]
+            for future in futures:
+                future.result()  # Re-raise any error from the writer thread.
         print(f"Done! Generated {SettlementDataGenerator.NUM_TRANSACTIONS} transactions, "
               f"{len(self.institutions)} institutions, and {len(self.accounts)} accounts.")
 
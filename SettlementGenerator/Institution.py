@@ -1,4 +1,6 @@
 class Institution:
+    __slots__ = ('institution_id', 'name', 'accounts')
+
     def __init__(self, institution_id, name):
         self.institution_id = institution_id
         self.name = name
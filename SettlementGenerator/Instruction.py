@@ -1,6 +1,13 @@
+from datetime import datetime
+
+
 class Instruction:
+    __slots__ = ('unique_id', 'mother_id', 'security_type', 'amount', 'is_child', 'status',
+                 'role', 'link_code', 'from_account', 'to_account', 'timestamp_epoch',
+                 'from_acct_id', 'to_acct_id', 'from_inst_id', 'to_inst_id')
+
     def __init__(self, unique_id, mother_id, security_type, amount,
-                 is_child, status, role, link_code, from_account, to_account, timestamp):
+                 is_child, status, role, link_code, from_account, to_account, timestamp_epoch):
         self.unique_id = unique_id
         self.mother_id = mother_id      # Always "DUMMY"
         self.security_type = security_type
@@ -11,14 +18,24 @@ class Instruction:
         self.link_code = link_code      # Shared between the two legs
         self.from_account = from_account  # Account sending the amount
         self.to_account = to_account      # Account receiving the amount
-        self.timestamp = timestamp      # Each instruction gets its own timestamp
+        # Flat copies of the account/institution IDs, so readers need one attribute load instead of two.
+        self.from_acct_id = from_account.accountID
+        self.to_acct_id = to_account.accountID
+        self.from_inst_id = from_account.institutionID
+        self.to_inst_id = to_account.institutionID
+        self.timestamp_epoch = timestamp_epoch  # Each instruction gets its own timestamp (whole epoch seconds)
+
+    @property
+    def timestamp(self):
+        # ISO string is only built when needed (e.g. when writing the CSV).
+        return datetime.fromtimestamp(self.timestamp_epoch).isoformat(sep='T', timespec='seconds')
 
     def __str__(self):
         return (f"Instruction({self.unique_id}, motherID: {self.mother_id}, "
                 f"{self.security_type}, {self.amount}, {self.is_child}, {self.status}, "
                 f"role: {self.role}, link_code: {self.link_code}, "
-                f"from_account: {self.from_account.account_id}, "
-                f"to_account: {self.to_account.account_id}, "
+                f"from_account: {self.from_acct_id}, "
+                f"to_account: {self.to_acct_id}, "
                 f"timestamp: {self.timestamp})")
 
 
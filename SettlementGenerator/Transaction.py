@@ -1,4 +1,6 @@
 class Transaction:
+    __slots__ = ('transaction_id', 'cash_instruction', 'bond_instruction')
+
     def __init__(self, transaction_id, cash_instruction, bond_instruction):
         self.transaction_id = transaction_id
         self.cash_instruction = cash_instruction  # Cash leg
@@ -1,26 +1,106 @@
+import csv
 import datetime
+import multiprocessing as mp
+import os
 import random
+import sys
+from enum import IntEnum
 from typing import List
-import pandas as pd
+import numpy as np
 from mesa import Agent, Model
 import time
+from logging import DEBUG, INFO, ERROR
+
+try:
+    import numba
+except ImportError:  # numba is optional; without it the kernels below run as plain Python.
+    numba = None
+
+
+class TxState(IntEnum):
+    """Transaction states, as stored in SettlementModel.transaction_states."""
+    PENDING = 0
+    VALIDATED = 1
+    MATCHED = 2
+    PARTIAL = 3
+    SETTLED = 4
+    FAILED = 5
+
+
+_TX_STATES = tuple(TxState)  # code -> TxState, cheaper than calling TxState(code)
+STATE_NAMES = ('Pending', 'Validated', 'Matched', 'Partially_Settled', 'Settled', 'Failed')  # display labels
+
+
+def _njit(func):
+    """Compile func with numba.njit(cache=True) when numba is available."""
+    return numba.njit(cache=True)(func) if numba is not None else func
+
+
+@_njit
+def _update_cash(cash, credit, idx, amount):
+    """Apply a cash change to account idx, drawing on its credit line once cash runs out.
+
+    Returns False (and changes nothing) if cash plus credit cannot cover a debit.
+    """
+    if amount < 0 and cash[idx] + credit[idx] + amount < 0:  # Check if deducting more than available
+        return False
+    if cash[idx] + amount >= 0:
+        cash[idx] += amount
+    else:
+        credit[idx] += amount + cash[idx]
+        cash[idx] = 0.0
+    return True
+
+
+def _log_number(value):
+    """Whole-number balances read back from the float64 arrays are logged as ints, as before."""
+    return int(value) if value.is_integer() else value
+
+
 #aanpassing
 class AccountAgent(Agent):
+    # mesa's Agent has no __slots__, so model/unique_id/pos still live in __dict__; our own fields don't.
+    __slots__ = ('accountID', 'state', 'participant', '_idx')
+
     def __init__(self, accountID, model, participant, cashBalance, creditLimit):
         super().__init__(model)
         self.accountID = accountID
         self.state = 'Pending'
         self.participant = participant
-        self.cashBalance = cashBalance
-        self.securities = {} #dictionary to store securities: (securityType: amount)
-        self.creditLimit = creditLimit
-        self.model.log_event(f"Account {accountID} created with balance {cashBalance} and credit limit {creditLimit}", accountID, is_transaction=False)
+        # Cash balance and credit limit live in the model's account arrays, at row self._idx.
+        self._idx = model._alloc_account(cashBalance, creditLimit)
+        self.model.log_event(INFO, "Account %s created with balance %s and credit limit %s", (accountID, cashBalance, creditLimit), accountID, is_transaction=False)
+
+    @property
+    def cashBalance(self):
+        return float(self.model.account_cash[self._idx])
+
+    @cashBalance.setter
+    def cashBalance(self, value):
+        self.model.account_cash[self._idx] = value
+
+    @property
+    def creditLimit(self):
+        return float(self.model.account_credit[self._idx])
+
+    @creditLimit.setter
+    def creditLimit(self, value):
+        self.model.account_credit[self._idx] = value
+
+    @property
+    def securities(self):
+        """Securities held by this account, as {securityType: amount}."""
+        row = self.model.account_securities[self._idx]
+        return {securityType: float(row[sid])
+                for sid, securityType in enumerate(self.model.security_types) if row[sid]}
 
     def checkSufficientCash(self, amount):
-        return self.cashBalance + self.creditLimit >= amount
+        return self.model.account_cash[self._idx] + self.model.account_credit[self._idx] >= amount
 
-    def checkSufficientSecurities(self, securityType: str, amount: float) -> bool:
-        return self.securities.get(securityType, 0) >= amount
+    def checkSufficientSecurities(self, securityType: str, amount: float, sid: int = None) -> bool:
+        if sid is None:
+            sid = self.model._intern(securityType)
+        return self.model.account_securities[self._idx, sid] >= amount
 
     def getCreditLimit(self):
         return self.creditLimit
@@ -28,37 +108,34 @@ class AccountAgent(Agent):
     def getCashBalance(self):
         return self.cashBalance
 
-    def updateSecurities(self, securityType: str, amount: float):
-        current_amount = self.securities.get(securityType, 0)
+    def updateSecurities(self, securityType: str, amount: float, sid: int = None):
+        if sid is None:
+            sid = self.model._intern(securityType)
+        holdings = self.model.account_securities
+        current_amount = holdings[self._idx, sid]
         if current_amount + amount < 0:
-            self.model.log_event(f"ERROR: Account {self.accountID} has insufficient securities of type {securityType}",
-                                 self.accountID, is_transaction=False)
+            self.model.log_event(ERROR, "ERROR: Account %s has insufficient securities of type %s",
+                                 (self.accountID, securityType), self.accountID, is_transaction=False)
             return 0
 
-        self.securities[securityType] = current_amount + amount
+        holdings[self._idx, sid] = current_amount + amount
         self.model.log_event(
-            f"Account {self.accountID} updated securities {securityType} by {amount}, new amount: {self.securities[securityType]}",
+            DEBUG, "Account %s updated securities %s by %s, new amount: %s",
+            (self.accountID, securityType, amount, _log_number(float(holdings[self._idx, sid]))),
             self.accountID,
             is_transaction=False
         )
         return amount
 
     def updateCashBalance(self, amount: float):
-        total_available = self.cashBalance + self.creditLimit
-        if amount < 0 and total_available + amount < 0:  # Check if deducting more than available
-            self.model.log_event(f"ERROR: Account {self.accountID} has insufficient funds", self.accountID,
+        if not _update_cash(self.model.account_cash, self.model.account_credit, self._idx, amount):
+            self.model.log_event(ERROR, "ERROR: Account %s has insufficient funds", (self.accountID,), self.accountID,
                                  is_transaction=False)
             return 0
 
-        if self.cashBalance + amount >= 0:
-            self.cashBalance += amount
-        else:
-            remaining = amount + self.cashBalance
-            self.cashBalance = 0
-            self.creditLimit += remaining
-
         self.model.log_event(
-            f"Account {self.accountID} updated cash balance by {amount}, new balance: {self.cashBalance}, new credit limit: {self.creditLimit}",
+            DEBUG, "Account %s updated cash balance by %s, new balance: %s, new credit limit: %s",
+            (self.accountID, amount, _log_number(self.cashBalance), _log_number(self.creditLimit)),
             self.accountID,
             is_transaction=False
         )
@@ -67,11 +144,14 @@ class AccountAgent(Agent):
 
     def end_account(self):
         if self.state == 'Ended':
-            self.model.log_event(f"ERROR: Attempt to end an already ended Account {self.accountID}", self.accountID, is_transaction=False)
+            self.model.log_event(ERROR, "ERROR: Attempt to end an already ended Account %s", (self.accountID,), self.accountID, is_transaction=False)
         else:
-            self.model.log_event(f"Account {self.accountID} is ending", self.accountID, is_transaction=False)
+            self.model.log_event(INFO, "Account %s is ending", (self.accountID,), self.accountID, is_transaction=False)
             self.state = 'Ended'
-            self.model.log_event(f"Account {self.accountID} ended", self.accountID, is_transaction=False)
+            self.model.log_event(INFO, "Account %s ended", (self.accountID,), self.accountID, is_transaction=False)
+
+    def step(self):
+        pass  # Accounts only react to instructions; scheduling them is a no-op.
 
 class InstitutionAgent(Agent):
 
@@ -80,32 +160,34 @@ class InstitutionAgent(Agent):
         self.institutionID = institutionID
         self.allow_partial: bool = True #default state allows partial
         self.accounts: List[AccountAgent] = []
-        self.model.log_event(f"Institution {institutionID} created", institutionID, is_transaction=False)
+        self._account_ids: set = set()  # accountIDs in self.accounts, for O(1) duplicate checks
+        self.model.log_event(INFO, "Institution %s created", (institutionID,), institutionID, is_transaction=False)
 
     def opt_out_partial(self):
         if not self.allow_partial:
-            self.model.log_event(f"ERROR: Institution {self.institutionID} already opted out of partial settlements", self.institutionID, is_transaction=False)
+            self.model.log_event(ERROR, "ERROR: Institution %s already opted out of partial settlements", (self.institutionID,), self.institutionID, is_transaction=False)
         else:
             self.allow_partial = False
-            self.model.log_event(f"Institution {self.institutionID} opted out of partial settlements", self.institutionID, is_transaction=False)
+            self.model.log_event(INFO, "Institution %s opted out of partial settlements", (self.institutionID,), self.institutionID, is_transaction=False)
 
     def opt_in_partial(self):
         if self.allow_partial:
-            self.model.log_event(f"ERROR: Institution {self.institutionID} already opted in for partial settlements", self.institutionID, is_transaction=False)
+            self.model.log_event(ERROR, "ERROR: Institution %s already opted in for partial settlements", (self.institutionID,), self.institutionID, is_transaction=False)
         else:
             self.allow_partial = True
-            self.model.log_event(f"Institution {self.institutionID} opted in for partial settlements", self.institutionID, is_transaction=False)
+            self.model.log_event(INFO, "Institution %s opted in for partial settlements", (self.institutionID,), self.institutionID, is_transaction=False)
 
 
     def add_account(self, account:AccountAgent):
-        if account in self.accounts:
-            self.model.log_event(f"ERROR: Duplicate account addition attempt for Institution {self.institutionID}", self.institutionID, is_transaction=False)
+        if account.accountID in self._account_ids:
+            self.model.log_event(ERROR, "ERROR: Duplicate account addition attempt for Institution %s", (self.institutionID,), self.institutionID, is_transaction=False)
         else:
             self.accounts.append(account)
-            self.model.log_event(f"Institution {self.institutionID} added Account {account.accountID}", self.institutionID, is_transaction=False)
+            self._account_ids.add(account.accountID)
+            self.model.log_event(INFO, "Institution %s added Account %s", (self.institutionID, account.accountID), self.institutionID, is_transaction=False)
 
     def step(self):
-        self.model.log_event(f"Institution {self.institutionID} stepping - Allow Partial: {self.allow_partial}", self.institutionID, is_transaction=False)    # Participants might modify their settings (randomly for testing)
+        self.model.log_event(DEBUG, "Institution %s stepping - Allow Partial: %s", (self.institutionID, self.allow_partial), self.institutionID, is_transaction=False)    # Participants might modify their settings (randomly for testing)
         if random.random() < 0.1:
             if self.allow_partial:
                 self.opt_out_partial()
@@ -114,78 +196,108 @@ class InstitutionAgent(Agent):
 
 
 class InstructionAgent:
+    __slots__ = ('uniqueID', 'motherID', 'securityType', 'sid', 'amount', 'isChild', 'childInstructions',
+                 'status', 'role', 'account', 'creation_time')
+    _pool: List['InstructionAgent'] = []  # released instructions, reused by acquire
+
     def __init__(self, uniqueID: str, motherID: str, securityType: str, amount: float, isChild: bool, status: str,
                  role: str, account: AccountAgent):
         self.uniqueID = uniqueID
         self.motherID = motherID
         self.securityType = securityType
+        self.sid = account.model._intern(securityType)  # column of securityType in model.account_securities
         self.amount = amount
         self.isChild = isChild
         self.childInstructions: List['InstructionAgent'] = []
         self.status = status
         self.role = role  # seller/buyer
         self.account = account
-        self.creation_time = datetime.datetime.now() # track creation time for timeout
+        self.creation_time = time.monotonic_ns()  # track creation time for timeout (integer ns, compare against monotonic_ns())
+
+    @classmethod
+    def acquire(cls, *args):
+        """Return an initialised instruction, reusing a released one when available."""
+        obj = cls._pool.pop() if cls._pool else object.__new__(cls)
+        obj.__init__(*args)
+        return obj
+
+    @classmethod
+    def release(cls, obj):
+        """Hand a finished instruction back to the pool; it must not be used afterwards."""
+        obj.account = None
+        obj.childInstructions = None
+        cls._pool.append(obj)
+
+    def _release_finished_children(self):
+        """Return settled/failed children to the pool and keep only the ones still pending."""
+        pending = []
+        for child in self.childInstructions:
+            if child.status in ("settled", "failed"):
+                InstructionAgent.release(child)
+            else:
+                pending.append(child)
+        self.childInstructions = pending
 
     def createChildren(self):
-        if self.role == "buyer" and not self.account.checkSufficientCash(self.amount):
-            available_cash = self.account.getCashBalance() + self.account.getCreditLimit()
-            if available_cash > 0:
+        acc = self.account
+        if self.role == "buyer":
+            available_cash = acc.cashBalance + acc.creditLimit
+            if 0 < available_cash < self.amount:
                 # Create buyer child instructions
-                buyer_child1 = InstructionAgent(
+                self._release_finished_children()
+                buyer_child1 = InstructionAgent.acquire(
                     f"{self.uniqueID}_1", self.uniqueID, self.securityType, available_cash, True,
-                    "settled", "buyer", self.account)
-                buyer_child2 = InstructionAgent(
+                    "settled", "buyer", acc)
+                buyer_child2 = InstructionAgent.acquire(
                     f"{self.uniqueID}_2", self.uniqueID, self.securityType, self.amount - available_cash, True,
-                    "pending", "buyer", self.account)
+                    "pending", "buyer", acc)
 
                 # Update buyer's account for settled amount
-                self.account.updateCashBalance(-available_cash)
+                acc.updateCashBalance(-available_cash)
 
-                # Add child instructions to the model @ruben dont know what this should do tbh
-                self.model.schedule.add(buyer_child1)
-                self.model.schedule.add(buyer_child2)
+                # Instructions are not scheduled agents; the mother keeps track of its children
+                self.childInstructions.extend((buyer_child1, buyer_child2))
 
-                self.model.log_event(
-                    f"Buyer instruction {self.uniqueID} created child instructions for partial settlement",
-                    self.uniqueID, is_transaction=True)
+                acc.model.log_event(
+                    INFO, "Buyer instruction %s created child instructions for partial settlement",
+                    (self.uniqueID,), self.uniqueID, is_transaction=True)
 
-        elif self.role == "seller" and not self.account.checkSufficientSecurities(self.securityType, self.amount):
-            available_securities = self.account.checkSufficientSecurities(self.securityType, self.amount)
-            if available_securities > 0:
+        elif self.role == "seller":
+            available_securities = float(acc.model.account_securities[acc._idx, self.sid])
+            if 0 < available_securities < self.amount:
                 # Create seller child instructions
-                seller_child1 = InstructionAgent(
+                self._release_finished_children()
+                seller_child1 = InstructionAgent.acquire(
                     f"{self.uniqueID}_1", self.uniqueID, self.securityType, available_securities, True,
-                    "settled", "seller", self.account
+                    "settled", "seller", acc
                 )
-                seller_child2 = InstructionAgent(
+                seller_child2 = InstructionAgent.acquire(
                     f"{self.uniqueID}_2", self.uniqueID, self.securityType, self.amount - available_securities, True,
-                    "pending", "seller", self.account
+                    "pending", "seller", acc
                 )
 
                 # Update seller's account for settled amount
-                self.account.updateSecurities(self.securityType, -available_securities)
+                acc.updateSecurities(self.securityType, -available_securities, self.sid)
 
-                # Add child instructions to the model @ruben same here i dont know what this does
-                self.model.schedule.add(seller_child1)
-                self.model.schedule.add(seller_child2)
+                # Instructions are not scheduled agents; the mother keeps track of its children
+                self.childInstructions.extend((seller_child1, seller_child2))
 
-                self.model.log_event(
-                    f"Seller instruction {self.uniqueID} created child instructions for partial settlement",
-                    self.uniqueID, is_transaction=True)
+                acc.model.log_event(
+                    INFO, "Seller instruction %s created child instructions for partial settlement",
+                    (self.uniqueID,), self.uniqueID, is_transaction=True)
 
 
     def settle(self):
         if self.role == "seller":
-            if self.account.checkSufficientSecurities(self.securityType, self.amount):
-                self.account.updateSecurities(self.securityType, -self.amount)
+            if self.account.checkSufficientSecurities(self.securityType, self.amount, self.sid):
+                self.account.updateSecurities(self.securityType, -self.amount, self.sid)
                 self.status = "settled"
             else:
                 self.status = "failed"
         elif self.role == "buyer":
             if self.account.checkSufficientCash(self.amount):
                 self.account.updateCashBalance(-self.amount)
-                self.account.updateSecurities(self.securityType, self.amount)
+                self.account.updateSecurities(self.securityType, self.amount, self.sid)
                 self.status = "settled"
             else:
                 self.createChildren()
@@ -199,83 +311,131 @@ class InstructionAgent:
 
 
 class TransactionAgent(Agent):
+    __slots__ = ('TransactionID', '_idx', 'seller', 'buyer', 'amount', 'linkcode')
+
     def __init__(self, TransactionID, model, seller: InstructionAgent, buyer: InstructionAgent, amount, linkcode):
         super().__init__(model)
         self.TransactionID = TransactionID
-        self.state = 'Pending'
+        self._idx = model._alloc_transaction()  # row in model.transaction_states
+        self.state = TxState.PENDING
         self.seller = seller
         self.buyer = buyer
         self.amount = amount
         self.linkcode = linkcode
-        self.model.log_event(f"Transaction {TransactionID} created from Account {seller.account.accountID} to Account {buyer.account.accountID} for {amount}", TransactionID, is_transaction=True)
+        self.model.log_event(INFO, "Transaction %s created from Account %s to Account %s for %s", (TransactionID, seller.account.accountID, buyer.account.accountID, amount), TransactionID, is_transaction=True)
+
+    @property
+    def state(self):
+        return _TX_STATES[self.model.transaction_states[self._idx]]
+
+    @state.setter
+    def state(self, new_state):
+        self.model.transaction_states[self._idx] = new_state
 
     def validate(self):
-        if self.state == 'Pending':
+        if self.state == TxState.PENDING:
             #.sleep(1) #1-second delay for validation
-            self.state = 'Validated'
-            self.model.log_event(f"Transaction {self.TransactionID} validated", self.TransactionID, is_transaction=True)
+            self.state = TxState.VALIDATED
+            self.model.log_event(INFO, "Transaction %s validated", (self.TransactionID,), self.TransactionID, is_transaction=True)
 
     def match(self):
-        self.model.log_event(f"Transaction {self.TransactionID} attempting to find a match", self.TransactionID, is_transaction=True)
-        if self.state == 'Validated':
+        self.model.log_event(DEBUG, "Transaction %s attempting to find a match", (self.TransactionID,), self.TransactionID, is_transaction=True)
+        if self.state == TxState.VALIDATED:
             # Match buyer and seller instructions
             if self.buyer.role == "buyer" and self.seller.role == "seller":
-                self.state = 'Matched'
-                self.model.log_event(f"Transaction {self.TransactionID} matched with buyer {self.buyer.uniqueID} and seller {self.seller.uniqueID}",self.TransactionID)
+                self.state = TxState.MATCHED
+                self.model.log_event(INFO, "Transaction %s matched with buyer %s and seller %s", (self.TransactionID, self.buyer.uniqueID, self.seller.uniqueID), self.TransactionID)
 
     def settle(self):
-        self.model.log_event(f"Transaction {self.TransactionID} attempting to settle", self.TransactionID,is_transaction=True)
+        self.model.log_event(DEBUG, "Transaction %s attempting to settle", (self.TransactionID,), self.TransactionID,is_transaction=True)
 
-        if self.state in ['Matched', 'Partially_Settled']:  # Allow reattempts for partial settlements
+        if self.state in (TxState.MATCHED, TxState.PARTIAL):  # Allow reattempts for partial settlements
             # Check if both buyer and seller can settle
             if self.buyer.checkCash() and self.seller.checkSecurities():
                 # Deduct cash from buyer and securities from seller
                 buyer_settled = self.buyer.account.updateCashBalance(-self.amount)
-                seller_settled = self.seller.account.updateSecurities(self.seller.securityType, -self.amount)
+                seller_settled = self.seller.account.updateSecurities(self.seller.securityType, -self.amount, self.seller.sid)
 
                 if buyer_settled > 0 and seller_settled > 0:
-                    self.state = 'Settled'
-                    self.model.log_event(f"Transaction {self.TransactionID} settled fully", self.TransactionID)
+                    self.state = TxState.SETTLED
+                    self.model.log_event(INFO, "Transaction %s settled fully", (self.TransactionID,), self.TransactionID)
                 else:
-                    self.state = 'Failed'
-                    self.model.log_event(f"ERROR: Transaction {self.TransactionID} failed to settle", self.TransactionID, is_transaction=True)
+                    self.state = TxState.FAILED
+                    self.model.log_event(ERROR, "ERROR: Transaction %s failed to settle", (self.TransactionID,), self.TransactionID, is_transaction=True)
             else:
                 # Create child instructions for partial settlement
                 self.buyer.createChildren()
                 self.seller.createChildren()
-                self.state = 'Partially_Settled'
-                self.model.log_event(f"Transaction {self.TransactionID} partially settled", self.TransactionID, is_transaction=True)
+                self.state = TxState.PARTIAL
+                self.model.log_event(INFO, "Transaction %s partially settled", (self.TransactionID,), self.TransactionID, is_transaction=True)
+
+    # State -> handler that moves a transaction on from that state; settle also retries partial settlements.
+    _STEP_TABLE = {TxState.PENDING: validate,
+                   TxState.VALIDATED: match,
+                   TxState.MATCHED: settle,
+                   TxState.PARTIAL: settle}
 
     def step(self):
         # Removed duplicate Transaction.step method to avoid conflicting transitions
-      self.model.log_event(f"Transaction {self.TransactionID} executing step", self.TransactionID, is_transaction=True)
-
-      if self.state == 'Exists':
-          self.transition()
-      if self.state == 'Pending':
-          self.validate()
-      if self.state == 'Validated':
-          self.match()
-      if self.state in ['Matched', 'Partially_Settled']:  # Retry full settlement if previously partial
-          self.settle()
+        self.model.log_event(DEBUG, "Transaction %s executing step", (self.TransactionID,), self.TransactionID, is_transaction=True)
+
+        # Advance through as many states as possible this step; each handler runs at most once.
+        step_table = self._STEP_TABLE
+        state = self.state
+        handler = step_table.get(state)
+        while handler is not None:
+            handler(self)
+            new_state = self.state
+            if new_state == state:  # no progress
+                break
+            state = new_state
+            next_handler = step_table.get(state)
+            if next_handler is handler:  # e.g. Matched -> Partially_Settled; retry settling next step
+                break
+            handler = next_handler
 
 class SettlementModel(Model):
-    def __init__(self, use_sample_data=False):
+    _LOG_FLUSH = 512  # Buffered log entries that trigger a flush from log_event
+
+    def __init__(self, use_sample_data=False, log_level=DEBUG):
         super().__init__()
+        self.log_level = log_level  # log_event drops entries below this level (DEBUG, INFO or ERROR)
         self.schedule = []
+        self._weights_raw = []  # scheduling weight of each agent in self.schedule, same order
+        self._p = None  # normalised _weights_raw as an array; rebuilt by step() after the schedule changes
         self.participants = []
         self.accounts = []
+        # Account state as arrays (SoA), one row per AccountAgent; rows in use: self._num_accounts.
+        self.account_cash = np.zeros(0, dtype=np.float64)
+        self.account_credit = np.zeros(0, dtype=np.float64)
+        # Holdings per (account row, security id); ids come from _intern and index security_types.
+        self.account_securities = np.zeros((0, 0), dtype=np.float64)
+        self._security_id = {}
+        self.security_types = []
+        self._num_accounts = 0
         self.transactions = []
-        self.event_log = []
-        self.activity_log = []
+        self.transaction_states = np.zeros(0, dtype=np.int8)  # TxState code per transaction, same order
+        self._num_transactions = 0
+        # Logs are stored column-wise (timestamps, agent IDs, messages); see event_log/activity_log.
+        self._ev_ts, self._ev_agent, self._ev_msg = [], [], []
+        self._act_ts, self._act_agent, self._act_msg = [], [], []
+        # (timestamp, agent_id, message) keys already in each log, for O(1) duplicate checks.
+        self._event_log_seen = set()
+        self._activity_log_seen = set()
+        self._log_buffer = []  # (timestamp, agent_id, template, args, is_transaction) awaiting _flush_logs
+        self._now_str = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # log timestamp, refreshed per step
 
         if use_sample_data:
             self.generate_sample_data()
+            self._flush_logs()
 
     def check_transaction_status(self):
-        settled_count = sum(1 for t in self.transactions if t.state == "Settled")
-        partially_settled_count = sum(1 for t in self.transactions if t.state == "Partially_Settled")
-        pending_count = sum(1 for t in self.transactions if t.state not in ["Settled", "Partially_Settled"])
+        states = self.transaction_states[:self._num_transactions]
+        counts = np.bincount(states, minlength=len(STATE_NAMES))
+        settled_count = counts[TxState.SETTLED]
+        partially_settled_count = counts[TxState.PARTIAL]
+        unsettled = np.flatnonzero((states != TxState.SETTLED) & (states != TxState.PARTIAL))
+        pending_count = len(unsettled)
 
         print("Simulation Summary:")
         print(f"Total Transactions: {len(self.transactions)}")
@@ -285,46 +445,125 @@ class SettlementModel(Model):
 
         if pending_count > 0:
             print("Unsettled Transactions:")
-            for t in self.transactions:
-                if t.state not in ["Settled", "Partially_Settled"]:
-                    print(f"Transaction {t.TransactionID} - State: {t.state}")
-
-    def log_event(self, message, agent_id, is_transaction=True):
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = {'Timestamp': timestamp, 'Agent ID': agent_id, 'Event': message}
-
-        if is_transaction:
-            if log_entry not in self.event_log:
-                print(f"{timestamp} | Agent ID: {log_entry['Agent ID']} | {message}")
-                self.event_log.append(log_entry)  # Ensures no duplicates
-        else:
-            if log_entry not in self.activity_log:
-                print(f"{timestamp} | Agent ID: {log_entry['Agent ID']} | {message}")
-                  # Ensures no duplicates
+            for i in unsettled:
+                t = self.transactions[i]
+                print(f"Transaction {t.TransactionID} - State: {STATE_NAMES[t.state]}")
+
+    @property
+    def event_log(self):
+        """Transaction events as a list of {'Timestamp', 'Agent ID', 'Event'} dicts."""
+        return [{'Timestamp': t, 'Agent ID': a, 'Event': m}
+                for t, a, m in zip(self._ev_ts, self._ev_agent, self._ev_msg)]
+
+    @property
+    def activity_log(self):
+        """All events as a list of {'Timestamp', 'Agent ID', 'Event'} dicts."""
+        return [{'Timestamp': t, 'Agent ID': a, 'Event': m}
+                for t, a, m in zip(self._act_ts, self._act_agent, self._act_msg)]
+
+    def log_event(self, level, template, args, agent_id, is_transaction=True):
+        # Like stdlib logging: drop entries below log_level before any formatting is done.
+        if level < self.log_level:
+            return
+        # Only record the raw entry here; formatting (template % args), dedup and printing happen in _flush_logs.
+        self._log_buffer.append((self._now_str, agent_id, template, args, is_transaction))
+        if len(self._log_buffer) >= self._LOG_FLUSH:
+            self._flush_logs()
+
+    def _flush_logs(self):
+        """Format the buffered log entries, print them in a single write and add them to the logs."""
+        lines = []
+        for timestamp, agent_id, template, args, is_transaction in self._log_buffer:
+            message = template % args
+            key = (timestamp, agent_id, message)
+
+            if is_transaction:
+                if key not in self._event_log_seen:
+                    lines.append(f"{timestamp} | Agent ID: {agent_id} | {message}")
+                    self._event_log_seen.add(key)
+                    self._ev_ts.append(timestamp)  # Ensures no duplicates
+                    self._ev_agent.append(agent_id)
+                    self._ev_msg.append(message)
+            else:
+                if key not in self._activity_log_seen:
+                    lines.append(f"{timestamp} | Agent ID: {agent_id} | {message}")
+                      # Ensures no duplicates
 
-        self.activity_log.append(log_entry)
+            self._activity_log_seen.add(key)
+            self._act_ts.append(timestamp)
+            self._act_agent.append(agent_id)
+            self._act_msg.append(message)
+        self._log_buffer.clear()
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
 
 
 
 
     def save_log(self, filename=None, activity_filename=None):
+        self._flush_logs()
         if filename is None:
             filename = "event_log.csv"  # Default filename
-        df = pd.DataFrame(self.event_log)
-        df.to_csv(filename, index=False)
+        self._write_log_csv(filename, self._ev_ts, self._ev_agent, self._ev_msg)
         if activity_filename is None:
             activity_filename = "activity_log.csv"
-        df_activity = pd.DataFrame(self.activity_log)
-        df_activity.to_csv(activity_filename, index=False)
+        self._write_log_csv(activity_filename, self._act_ts, self._act_agent, self._act_msg)
         print(f"Activity log saved to {activity_filename}")
         print(f"Event Log saved to {filename}")
 
+    @staticmethod
+    def _write_log_csv(filename, timestamps, agent_ids, messages):
+        """Stream one log's columns to filename as a Timestamp,Agent ID,Event CSV."""
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['Timestamp', 'Agent ID', 'Event'])
+            writer.writerows(zip(timestamps, agent_ids, messages))
+
+    def _alloc_account(self, cashBalance, creditLimit):
+        """Reserve a row in the account arrays (growing them geometrically) and return its index."""
+        idx = self._num_accounts
+        if idx == len(self.account_cash):
+            grow = max(16, idx)
+            self.account_cash = np.concatenate((self.account_cash, np.zeros(grow)))
+            self.account_credit = np.concatenate((self.account_credit, np.zeros(grow)))
+            self.account_securities = np.concatenate(
+                (self.account_securities, np.zeros((grow, len(self.security_types)))))
+        self.account_cash[idx] = cashBalance
+        self.account_credit[idx] = creditLimit
+        self._num_accounts = idx + 1
+        return idx
+
+    def _alloc_transaction(self):
+        """Reserve a row in transaction_states (growing it geometrically) and return its index."""
+        idx = self._num_transactions
+        if idx == len(self.transaction_states):
+            self.transaction_states = np.concatenate(
+                (self.transaction_states, np.zeros(max(16, idx), dtype=np.int8)))
+        self._num_transactions = idx + 1
+        return idx
+
+    def _intern(self, securityType):
+        """Return the integer id of securityType, adding a holdings column on first use."""
+        sid = self._security_id.get(securityType)
+        if sid is None:
+            sid = self._security_id[securityType] = len(self.security_types)
+            self.security_types.append(securityType)
+            self.account_securities = np.concatenate(
+                (self.account_securities, np.zeros((len(self.account_cash), 1))), axis=1)
+        return sid
+
+    def add_agent(self, agent):
+        """Add an agent to the schedule together with its scheduling weight."""
+        self.schedule.append(agent)
+        self._weights_raw.append(0.95 if isinstance(agent, TransactionAgent) else 0.025)
+        self._p = None
+
     def generate_sample_data(self):
         # Create institutions and accounts
         for i in range(5):
             participant = InstitutionAgent(i, self)  # Create institution
             self.participants.append(participant)
-            self.schedule.append(participant)
+            self.add_agent(participant)
 
             # Create an account for the institution
             account = AccountAgent(
@@ -335,14 +574,13 @@ class SettlementModel(Model):
             account.updateSecurities("bond", random.randint(500, 1000))  # Add securities
             participant.add_account(account)
             self.accounts.append(account)
-            self.schedule.append(account)
+            self.add_agent(account)
 
         # Create transactions
         for i in range(20):
-            sender = random.choice(self.accounts)
+            sender, receiver = random.sample(self.accounts, 2)
             # Ensure some transactions will partially settle by choosing larger amounts
             amount = random.randint(100, 300) if sender.cashBalance < 100 else random.randint(30, 150)
-            receiver = random.choice([acc for acc in self.accounts if acc != sender])
 
             # Create buyer and seller instructions
             seller_instruction = InstructionAgent(
@@ -354,30 +592,69 @@ class SettlementModel(Model):
             transaction = TransactionAgent(
                 i, self, seller_instruction, buyer_instruction, amount=amount, linkcode=random.randint(0, 10))
             self.transactions.append(transaction)
-            self.schedule.append(transaction)
+            self.add_agent(transaction)
 
     def step(self):
+        self._now_str = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         print(f"Running simulation step {self.schedule.count}...")
-        for _ in range(len(self.schedule)):
-            agent = random.choices(self.schedule, weights=[0.95 if isinstance(a, TransactionAgent) else 0.025 for a in self.schedule])[0]
-            if isinstance(agent, TransactionAgent) or isinstance(agent, InstitutionAgent) or isinstance(agent, AccountAgent):
-                agent.step()
+        if self._p is None:
+            weights = np.asarray(self._weights_raw)
+            self._p = weights / weights.sum()
+        schedule = self.schedule
+        # Draw every agent activation for this step at once, weighted by the cached probabilities.
+        for i in np.random.choice(len(schedule), size=len(schedule), p=self._p).tolist():
+            schedule[i].step()
+        self._flush_logs()
         print("Step completed.")
 
 
 
-if __name__ == "__main__":
-    print("Starting simulation...")
-    log_path = input("Enter the path to save the log (press Enter for default): ")
-    if not log_path.strip():
-        log_path = "event_log.csv"
+def run_one(seed, steps=100):
+    """Run one seeded simulation on sample data and return its event log."""
+    random.seed(seed)
+    np.random.seed(seed)  # step() draws the agent activations from numpy's generator
     model = SettlementModel(use_sample_data=True)
-    for _ in range(100):
+    for _ in range(steps):
         model.step()
-    print("Final Event Log:")
-    for event in model.event_log:
-        print(event)
-    print("Saving final event log...")
-    model.check_transaction_status()
-    model.save_log(log_path)
+    return model.event_log
+
 
+if __name__ == "__main__":
+    # Usage: python Simulator.py [runs [log_path]]. Without arguments the run count comes from
+    # SIM_RUNS (default 1) and the log path is asked for, as before.
+    runs = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("SIM_RUNS", "1")
+    try:
+        n_runs = int(runs)
+    except ValueError:
+        n_runs = 0
+    if n_runs < 1:
+        sys.exit(f"Number of runs must be a positive integer, got {runs!r}")
+    print("Starting simulation...")
+    if len(sys.argv) > 1:
+        log_path = sys.argv[2] if len(sys.argv) > 2 else "event_log.csv"
+    else:
+        log_path = input("Enter the path to save the log (press Enter for default): ")
+        if not log_path.strip():
+            log_path = "event_log.csv"
+    if n_runs == 1:
+        model = SettlementModel(use_sample_data=True)
+        for _ in range(100):
+            model.step()
+        print("Final Event Log:")
+        for event in model.event_log:
+            print(event)
+        print("Saving final event log...")
+        model.check_transaction_status()
+        model.save_log(log_path)
+    else:
+        # Independent seeds run in parallel, one simulation per worker process.
+        with mp.Pool() as pool:
+            results = pool.map(run_one, range(n_runs))
+        stem, ext = os.path.splitext(log_path)
+        for seed, event_log in enumerate(results):
+            seed_path = f"{stem}_{seed}{ext}"
+            SettlementModel._write_log_csv(seed_path,
+                                           [e['Timestamp'] for e in event_log],
+                                           [e['Agent ID'] for e in event_log],
+                                           [e['Event'] for e in event_log])
+            print(f"Event Log for seed {seed} saved to {seed_path}")
@@ -0,0 +1,32 @@
+"""Ahead-of-time compile the euroclear instruction kernels into the settlement_kernels extension.
+
+Run `python build_kernels.py` once (numba required); "euroclear system agent.py" then imports
+validate_batch and match_batch from the built module instead of JIT-compiling them on first use.
+"""
+import importlib.util
+import os
+import sys
+
+from numba.pycc import CC
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Load the kernels' Python source from the simulation module itself, so there is one definition.
+sys.modules["settlement_kernels"] = None  # don't pick up a previously built copy
+spec = importlib.util.spec_from_file_location("euroclear_system_agent",
+                                              os.path.join(HERE, "euroclear system agent.py"))
+euroclear = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = euroclear
+spec.loader.exec_module(euroclear)
+del sys.modules["settlement_kernels"]
+
+cc = CC("settlement_kernels")
+cc.output_dir = HERE
+cc.export("validate_batch", "void(i8[:], i1[:], f8[:], f8[:], i1[:])")(
+    euroclear.validate_batch.py_func)
+cc.export("match_batch", "UniTuple(i8[:], 2)(i8[:], i8[:], i1[:], i8[:, :])")(
+    euroclear.match_batch.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
+    print(f"Built settlement_kernels in {HERE}")
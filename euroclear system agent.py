@@ -1,24 +1,67 @@
 import random
 import datetime
 import csv
+import os
+from multiprocessing import Pool
+from dataclasses import dataclass
+from enum import IntEnum
+import numpy as np
 from mesa import Agent, Model
-from mesa.time import RandomActivation
+
+try:
+    import numba
+except ImportError:  # without numba, validate_batch/match_batch stay Python (or come from build_kernels.py)
+    numba = None
 #alternative way of modeling, we have to dubblecheck if this is more useful
-# --- Logger Class (unchanged) ---
+# --- Logger Class ---
 class Logger:
-    def __init__(self):
-        self.logs = []
-        self.logs.append(["Step", "Timestamp", "Agent", "Event", "TransactionID", "Details"])
+    SUMMARY = 0  # per-step summaries and institution events only
+    VERBOSE = 1  # also one entry per instruction/transaction handled
+    FLUSH_ROWS = 10000  # rows kept in memory before they are appended to the log file
+    HEADER = ("Step", "Timestamp", "Agent", "Event", "TransactionID", "Details")
+    def __init__(self, level=VERBOSE, path="simulation_log.csv"):
+        self.level = level
+        # Agents check this before building per-transaction messages, so quiet runs skip the formatting.
+        self.verbose = level >= Logger.VERBOSE
+        # Rows are buffered and appended to path in batches, so memory stays bounded on long runs.
+        # The file is only opened by the first flush; close() (or write_csv) releases it.
+        self.path = path
+        self.rows = []
+        self.fh = None
+        self.writer = None
     def log(self, step, agent_name, event, tx_id, details=""):
         timestamp = datetime.datetime.now().isoformat()
-        self.logs.append([step, timestamp, agent_name, event, tx_id, details])
-    def write_csv(self, filename="simulation_log.csv"):
-        with open(filename, "w", newline="") as f:
-            csv.writer(f).writerows(self.logs)
-        print(f"Log written to {filename}")
+        self.rows.append((step, timestamp, agent_name, event, tx_id, details))
+        if len(self.rows) >= Logger.FLUSH_ROWS:
+            self.flush()
+    def flush(self):
+        """Append the buffered rows to the log file, creating it with its header on first use."""
+        if self.fh is None:
+            self.fh = open(self.path, "w", newline="")
+            self.writer = csv.writer(self.fh)
+            self.writer.writerow(Logger.HEADER)
+        self.writer.writerows(self.rows)
+        self.rows.clear()
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+    def write_csv(self, filename=None):
+        """Finish the log; it ends up at filename (moved there if part of it was already written to path)."""
+        moved = filename is not None and os.path.abspath(filename) != os.path.abspath(self.path)
+        if moved and self.fh is None:
+            self.path = filename  # nothing written yet: write straight to filename
+            moved = False
+        self.flush()
+        self.close()
+        if moved:
+            os.replace(self.path, filename)
+            self.path = filename
+        print(f"Log written to {self.path}")
 
-# --- Messaging Infrastructure (unchanged) ---
+# --- Messaging Infrastructure ---
 class Message:
+    __slots__ = ("sender", "recipient", "msg_type", "content")
     def __init__(self, sender, recipient, msg_type, content):
         self.sender = sender
         self.recipient = recipient
@@ -41,10 +84,105 @@ class Account:
     def check_balance(self, amount):
         return (self.balance - amount) >= self.min_balance
 
+# --- Instruction kernels ---
+# Instructions are also stored column-wise on the model (instr_tx, instr_type, instr_status,
+# instr_qty, instr_price; one row per live SettlementInstruction) so validation and matching
+# can run as compiled loops over plain arrays once a batch is large enough to pay for the call.
+
+class Status(IntEnum):
+    """SettlementInstruction status; the values are also the instr_status codes."""
+    NEW = 0
+    CANCELED = 1
+    SETTLED = 2
+
+_STATUSES = tuple(Status)  # instr_status code -> Status
+PAYMENT, SECURITY = 0, 1  # instr_type codes
+STATUS_CANCELED = int(Status.CANCELED)  # plain int for the compiled kernels
+SKIPPED, VALID, INVALID = 0, 1, 2  # validate_batch results
+# Smallest batch handed to the kernels; below it, converting the batch to row arrays and the
+# kernel call cost more than the plain per-instruction loops in ValidationAgent/MatchingAgent.
+KERNEL_MIN_BATCH = 10
+
+def _njit(func):
+    """njit an instruction kernel (cached on disk) if numba is installed, else return it unchanged."""
+    return numba.njit(cache=True)(func) if numba is not None else func
+
+@_njit
+def validate_batch(rows, status, qty, price, result):
+    """Validate the instructions at rows; result[i] becomes SKIPPED (canceled), VALID or INVALID."""
+    for i in range(rows.shape[0]):
+        r = rows[i]
+        if status[r] == STATUS_CANCELED:
+            result[i] = SKIPPED
+        elif qty[r] > 0 and price[r] > 0:
+            result[i] = VALID
+        else:
+            result[i] = INVALID
+
+@_njit
+def match_batch(rows, tx, typ, pending):
+    """Record the legs at rows in pending (tx -> [payment row, security row], -1 if not seen yet).
+
+    rows must not contain canceled instructions (validation filters them out). Returns the
+    payment and security rows of every transaction whose second leg arrived in this batch;
+    those transactions are cleared from pending.
+    """
+    payment_rows = np.empty(rows.shape[0], np.int64)
+    security_rows = np.empty(rows.shape[0], np.int64)
+    n = 0
+    for i in range(rows.shape[0]):
+        r = rows[i]
+        t = tx[r]
+        pending[t, typ[r]] = r
+        if pending[t, PAYMENT] >= 0 and pending[t, SECURITY] >= 0:
+            payment_rows[n] = pending[t, PAYMENT]
+            security_rows[n] = pending[t, SECURITY]
+            n += 1
+            pending[t, PAYMENT] = -1
+            pending[t, SECURITY] = -1
+    return payment_rows[:n], security_rows[:n]
+
+# Prefer the ahead-of-time compiled kernels from build_kernels.py: they skip the JIT compile on
+# the first step. Without the built module the @_njit versions above are used.
+try:
+    from settlement_kernels import validate_batch, match_batch
+except ImportError:
+    pass
+
+NO_SKIP, SKIP_CASH, SKIP_SECURITIES = 0, 1, 2  # cap_settlement skip codes
+
+def cap_settlement(net_amount, quantity, cash_account, security_account):
+    """Cap one settlement to what the payer's cash and the deliverer's securities can cover.
+
+    The net amount is capped first (the quantity follows at the same price), then the quantity.
+    Returns (net_amount, quantity, adjusted, skip) where skip is NO_SKIP, SKIP_CASH or
+    SKIP_SECURITIES when the settlement cannot go ahead at all.
+    """
+    price = net_amount / quantity if quantity else 0
+    adjusted = False
+    if not cash_account.check_balance(net_amount):
+        allowed_cash = cash_account.balance - cash_account.min_balance
+        if allowed_cash <= 0:
+            return net_amount, quantity, adjusted, SKIP_CASH
+        net_amount = allowed_cash
+        quantity = int(net_amount / price)
+        adjusted = True
+    if not security_account.check_balance(quantity):
+        allowed_qty = security_account.balance - security_account.min_balance
+        if allowed_qty <= 0:
+            return net_amount, quantity, adjusted, SKIP_SECURITIES
+        quantity = allowed_qty
+        net_amount = quantity * price
+        adjusted = True
+    return net_amount, quantity, adjusted, NO_SKIP
+
 # --- Data Object Classes ---
 
 # Updated SettlementInstruction with sending/receiving institutions and accounts
 class SettlementInstruction:
+    __slots__ = ("instruction_id", "transaction_id", "instruction_type", "security_id", "quantity", "price",
+                 "timestamp", "sendingInstitution", "receivingInstitution", "sendingAccount", "receivingAccount",
+                 "_status", "model", "row")
     def __init__(self, instruction_id, transaction_id, instruction_type, security_id,
                  quantity, price, timestamp, sendingInstitution, receivingInstitution,
                  sendingAccount, receivingAccount):
@@ -59,49 +197,51 @@ class SettlementInstruction:
         self.receivingInstitution = receivingInstitution
         self.sendingAccount = sendingAccount
         self.receivingAccount = receivingAccount
-        self.status = "New"  # Other statuses: "Canceled", "Settled"
+        self._status = Status.NEW  # only used while the instruction holds no row (see status)
+        self.model = None  # set, together with row, by SettlementModel.add_instruction
+        self.row = -1
+    @property
+    def status(self):
+        # While the instruction holds a row, model.instr_status is the only copy of its status.
+        if self.row < 0:
+            return self._status
+        return _STATUSES[self.model.instr_status[self.row]]
+    @status.setter
+    def status(self, value):
+        if self.row < 0:
+            self._status = value
+        else:
+            self.model.instr_status[self.row] = value
     def validate(self):
         return self.quantity > 0 and self.price > 0
     def cancel(self):
-        if self.status not in ["Settled", "Canceled"]:
-            self.status = "Canceled"
+        if self.status == Status.NEW:
+            self.status = Status.CANCELED
 
 # New CancelInstruction class
 class CancelInstruction:
+    __slots__ = ("cancel_id", "transaction_id", "sendingInstitution", "timestamp", "status")
     def __init__(self, cancel_id, transaction_id, sendingInstitution, timestamp):
         self.cancel_id = cancel_id
         self.transaction_id = transaction_id
         self.sendingInstitution = sendingInstitution
         self.timestamp = timestamp
-        self.status = "New"  # Status could be "Processed" once handled
-
-# Other data classes remain unchanged.
-class ClearingReport:
-    def __init__(self, transaction_id, payer, deliverer, quantity, price, net_amount, risk):
-        self.transaction_id = transaction_id
-        self.payer = payer
-        self.deliverer = deliverer
-        self.quantity = quantity
-        self.price = price
-        self.net_amount = net_amount
-        self.risk = risk
-
-class PositioningReport:
-    def __init__(self, transaction_id, payer, deliverer, quantity, net_amount, timestamp):
-        self.transaction_id = transaction_id
-        self.payer = payer
-        self.deliverer = deliverer
-        self.quantity = quantity
-        self.net_amount = net_amount
-        self.timestamp = timestamp
+        self.status = Status.NEW
 
-class SettlementConfirmation:
-    def __init__(self, transaction_id, settlement_status, settlement_date, adjusted_quantity, adjusted_net_amount):
-        self.transaction_id = transaction_id
-        self.settlement_status = settlement_status  # "Full" or "Partial"
-        self.settlement_date = settlement_date
-        self.adjusted_quantity = adjusted_quantity
-        self.adjusted_net_amount = adjusted_net_amount
+# One record per cleared transaction, filled in place as it moves through the pipeline:
+# clearing sets price/net_amount/risk, positioning the timestamp, settlement the status and the
+# (possibly reduced) quantity and net_amount.
+@dataclass(slots=True)
+class TxRecord:
+    transaction_id: str
+    payer: "InstitutionAgent"
+    deliverer: "InstitutionAgent"
+    quantity: int
+    price: float
+    net_amount: float
+    risk: float = 0.0
+    status: str = ""  # "Full" or "Partial" once settled
+    timestamp: datetime.datetime | None = None
 
 # --- Agent Classes with Cancellation Instructions ---
 
@@ -122,25 +262,29 @@ class InstitutionAgent(Agent):
         msg = Message(self, recipient, msg_type, content)
         recipient.inbox.append(msg)
     def process_messages(self):
+        verbose = self.model.logger.verbose
         while self.inbox:
             msg = self.inbox.pop(0)
             if msg.msg_type == "validation_result":
                 if msg.content["status"] == "Invalid":
-                    self.model.logger.log(self.model.current_step, self.name, "ReceivedInvalidation",
-                                            msg.content["instruction_id"], "May reinitiate later")
+                    if verbose:
+                        self.model.logger.log(self.model.current_step, self.name, "ReceivedInvalidation",
+                                                msg.content["instruction_id"], "May reinitiate later")
                 else:
-                    self.model.logger.log(self.model.current_step, self.name, "ReceivedValidation",
-                                            msg.content["instruction_id"], "Validated successfully")
+                    if verbose:
+                        self.model.logger.log(self.model.current_step, self.name, "ReceivedValidation",
+                                                msg.content["instruction_id"], "Validated successfully")
             elif msg.msg_type == "settlement_confirmation":
-                self.model.logger.log(self.model.current_step, self.name, "SettlementConfirmation",
-                                        msg.content["transaction_id"], msg.content["settlement_status"])
+                if verbose:
+                    self.model.logger.log(self.model.current_step, self.name, "SettlementConfirmation",
+                                            msg.content["transaction_id"], msg.content["settlement_status"])
     def step(self):
         self.process_messages()
         # With some probability, create a cancellation for a pending transaction
         pending_tx = [instr.transaction_id for instr in self.model.instructions
-                      if instr.sendingInstitution == self and instr.status not in ["Canceled", "Settled"]]
+                      if instr.sendingInstitution == self and instr.status == Status.NEW]
         pending_tx += [instr.transaction_id for instr in self.model.validated_instructions
-                      if instr.sendingInstitution == self and instr.status not in ["Canceled", "Settled"]]
+                      if instr.sendingInstitution == self and instr.status == Status.NEW]
         pending_tx = list(set(pending_tx))
         if pending_tx and random.random() < self.cancel_probability:
             tx_to_cancel = random.choice(pending_tx)
@@ -189,6 +333,8 @@ class InstitutionAgent(Agent):
                 sendingAccount=counterparty.security_account,
                 receivingAccount=self.security_account
             )
+            self.model.add_instruction(payment_instr)
+            self.model.add_instruction(security_instr)
             self.model.instructions.extend([payment_instr, security_instr])
             self.model.logger.log(self.model.current_step, self.name, "InitiatedTransaction", tx_id,
                                     f"Qty: {quantity}, Price: {price} with {counterparty.name}")
@@ -209,22 +355,32 @@ class ValidationAgent(Agent):
         canceled_count = 0
         # Cancel in instructions
         for instr in self.model.instructions:
-            if not hasattr(instr, "cancel_id") and instr.transaction_id == tx and instr.status not in ["Canceled", "Settled"]:
+            if not hasattr(instr, "cancel_id") and instr.transaction_id == tx and instr.status == Status.NEW:
                 instr.cancel()
                 canceled_count += 1
         # Cancel in validated_instructions
         for instr in self.model.validated_instructions:
-            if instr.transaction_id == tx and instr.status not in ["Canceled", "Settled"]:
+            if instr.transaction_id == tx and instr.status == Status.NEW:
                 instr.cancel()
                 canceled_count += 1
-        # Cancel in matched_pairs
-        if tx in self.model.matched_pairs:
-            pair = self.model.matched_pairs[tx]
-            for key in pair:
-                if pair[key] is not None and pair[key].status not in ["Canceled", "Settled"]:
-                    pair[key].cancel()
+        # Cancel legs waiting for their counterpart in pending_legs; they leave the pipeline here
+        slot = self.model.tx_numbers.get(tx)
+        if slot is not None:
+            legs = [self.model.instr_objs[r] for r in self.model.pending_legs[slot].tolist() if r >= 0]
+            self.model.pending_legs[slot] = -1
+            for instr in legs:
+                if instr.status == Status.NEW:
+                    instr.cancel()
                     canceled_count += 1
-            del self.model.matched_pairs[tx]
+                self.model.release_instruction(instr)
+        # Cancel in complete_pairs (waiting for clearing)
+        pair = self.model.complete_pairs.pop(tx, None)
+        if pair is not None:
+            for instr in pair:
+                if instr.status == Status.NEW:
+                    instr.cancel()
+                    canceled_count += 1
+                self.model.release_instruction(instr)
         self.model.logger.log(self.model.current_step, self.name, "ProcessedCancellation", tx, f"Canceled {canceled_count} instructions")
     def step(self):
         # Process cancellation instructions if any are in the instructions queue
@@ -238,19 +394,33 @@ class ValidationAgent(Agent):
 
         # Now process regular settlement instructions
         if self.model.instructions:
-            new_instr = self.model.instructions[:]
+            verbose = self.model.logger.verbose
+            new_instr = [instr for instr in self.model.instructions if isinstance(instr, SettlementInstruction)]
             self.model.instructions = []
-            for instr in new_instr:
-                if isinstance(instr, SettlementInstruction):
-                    if instr.status == "Canceled":
+            if len(new_instr) >= KERNEL_MIN_BATCH:
+                rows = np.fromiter((instr.row for instr in new_instr), dtype=np.int64, count=len(new_instr))
+                results = np.empty(len(new_instr), dtype=np.int8)
+                validate_batch(rows, self.model.instr_status, self.model.instr_qty, self.model.instr_price, results)
+                results = results.tolist()
+            else:
+                results = [SKIPPED if instr.status == Status.CANCELED else VALID if instr.validate() else INVALID
+                           for instr in new_instr]
+            release = self.model.release_instruction
+            for instr, result in zip(new_instr, results):
+                if result == SKIPPED:
+                    release(instr)
+                    if verbose:
                         self.model.logger.log(self.model.current_step, self.name, "SkippedCanceledInstruction", instr.instruction_id, "")
-                        continue
-                    if instr.validate():
-                        self.model.validated_instructions.append(instr)
-                        self.send_message(instr.sendingInstitution, "validation_result", {"instruction_id": instr.instruction_id, "status": "Valid"})
+                    continue
+                if result == VALID:
+                    self.model.validated_instructions.append(instr)
+                    self.send_message(instr.sendingInstitution, "validation_result", {"instruction_id": instr.instruction_id, "status": "Valid"})
+                    if verbose:
                         self.model.logger.log(self.model.current_step, self.name, "ValidatedInstruction", instr.instruction_id, "Valid")
-                    else:
-                        self.send_message(instr.sendingInstitution, "validation_result", {"instruction_id": instr.instruction_id, "status": "Invalid"})
+                else:
+                    release(instr)
+                    self.send_message(instr.sendingInstitution, "validation_result", {"instruction_id": instr.instruction_id, "status": "Invalid"})
+                    if verbose:
                         self.model.logger.log(self.model.current_step, self.name, "ValidatedInstruction", instr.instruction_id, "Invalid")
 
 class MatchingAgent(Agent):
@@ -262,62 +432,73 @@ class MatchingAgent(Agent):
         self.name = name
         self.inbox = []
     def step(self):
-        for instr in self.model.validated_instructions:
-            if instr.status == "Canceled":
-                continue
-            tx = instr.transaction_id
-            if tx not in self.model.matched_pairs:
-                self.model.matched_pairs[tx] = {"Payment": None, "Security": None}
-            self.model.matched_pairs[tx][instr.instruction_type] = instr
+        log = self.model.logger.log
+        step = self.model.current_step
+        name = self.name
+        complete = self.model.complete_pairs
+        validated = self.model.validated_instructions
+        objs = self.model.instr_objs
+        if len(validated) >= KERNEL_MIN_BATCH:
+            rows = np.fromiter((instr.row for instr in validated), dtype=np.int64, count=len(validated))
+            payment_rows, security_rows = match_batch(rows, self.model.instr_tx, self.model.instr_type,
+                                                      self.model.pending_legs)
+            # Both legs are in: hand the pair to clearing straight away
+            for p, s in zip(payment_rows.tolist(), security_rows.tolist()):
+                payment = objs[p]
+                complete[payment.transaction_id] = [payment, objs[s]]
+        elif validated:
+            # Same bookkeeping as match_batch, one instruction at a time
+            pending = self.model.pending_legs
+            instr_tx = self.model.instr_tx
+            for instr in validated:
+                legs = pending[instr_tx[instr.row]]
+                legs[PAYMENT if instr.instruction_type == "Payment" else SECURITY] = instr.row
+                p, s = legs.tolist()
+                if p >= 0 and s >= 0:
+                    complete[instr.transaction_id] = [objs[p], objs[s]]
+                    legs[:] = -1
         self.model.validated_instructions = []
-        complete = {tx: pair for tx, pair in self.model.matched_pairs.items()
-                    if pair["Payment"] and pair["Security"] and
-                       pair["Payment"].status != "Canceled" and pair["Security"].status != "Canceled"}
-        self.model.matched_pairs = complete
-        self.model.logger.log(self.model.current_step, self.name, "MatchedTransactions", "", f"{len(complete)} complete pairs")
+        log(step, name, "MatchedTransactions", "", f"{len(complete)} complete pairs")
 
 class ClearingAgent(Agent):
     """
-    Objective: Compute net amounts and risks from matched transactions.
+    Objective: Compute net amounts and risks from matched transactions and emit the
+    matching positioning reports in the same pass.
     """
     def __init__(self, unique_id, name, model):
         super().__init__(unique_id, model)
         self.name = name
         self.inbox = []
     def step(self):
-        for tx, pair in list(self.model.matched_pairs.items()):
-            if pair["Payment"].status == "Canceled" or pair["Security"].status == "Canceled":
-                self.model.logger.log(self.model.current_step, self.name, "CanceledPair", tx, "Skipping canceled transaction")
-                del self.model.matched_pairs[tx]
-                continue
-            payment = pair["Payment"]
-            net_amount = payment.quantity * payment.price
-            risk = net_amount * 0.05
-            report = ClearingReport(tx, payment.sendingInstitution, pair["Security"].sendingInstitution,
-                                      payment.quantity, payment.price, net_amount, risk)
-            self.model.clearing_reports.append(report)
-            self.model.total_possible_net += net_amount
-            self.model.logger.log(self.model.current_step, self.name, "ClearingReport", tx, f"Net: {net_amount}, Risk: {risk}")
-            del self.model.matched_pairs[tx]
-        self.model.logger.log(self.model.current_step, self.name, "ClearingComplete", "", f"{len(self.model.clearing_reports)} reports generated")
-
-class PositioningAgent(Agent):
-    """
-    Objective: Generate positioning reports.
-    """
-    def __init__(self, unique_id, name, model):
-        super().__init__(unique_id, model)
-        self.name = name
-        self.inbox = []
-    def step(self):
-        for report in self.model.clearing_reports:
-            pos_report = PositioningReport(report.transaction_id, report.payer, report.deliverer,
-                                           report.quantity, report.net_amount, datetime.datetime.now())
-            self.model.positioning_reports.append(pos_report)
-            self.model.logger.log(self.model.current_step, self.name, "PositioningReport", report.transaction_id, f"Qty: {report.quantity}, Net: {report.net_amount}")
-        count = len(self.model.clearing_reports)
-        self.model.clearing_reports = []
-        self.model.logger.log(self.model.current_step, self.name, "PositioningComplete", "", f"{count} reports generated")
+        verbose = self.model.logger.verbose
+        log = self.model.logger.log
+        step = self.model.current_step
+        name = self.name
+        # Canceled legs never reach complete_pairs (validation filters them out and cancellations pop
+        # their transaction), so every pair here is live.
+        pairs = self.model.complete_pairs
+        n = len(pairs)
+        # Every pair yields exactly one record, so the list is sized up front
+        records = self.model.tx_records = [None] * n
+        release = self.model.release_instruction
+        if pairs:
+            # A handful of pairs per tick: plain scalar arithmetic beats building arrays for them
+            now = datetime.datetime.now()  # records cleared this tick share one positioning timestamp
+            for i, (tx, (payment, security)) in enumerate(pairs.items()):  # matching order
+                payer = payment.sendingInstitution
+                deliverer = security.sendingInstitution
+                quantity = payment.quantity
+                net_amount = quantity * payment.price
+                risk = net_amount * 0.05
+                self.model.total_possible_net += net_amount
+                records[i] = TxRecord(tx, payer, deliverer, quantity, payment.price, net_amount, risk, "", now)
+                release(payment)
+                release(security)
+                if verbose:
+                    log(step, name, "ClearingReport", tx, f"Net: {net_amount}, Risk: {risk}")
+                    log(step, name, "PositioningReport", tx, f"Qty: {quantity}, Net: {net_amount}")
+            pairs.clear()
+        log(step, name, "ClearingComplete", "", f"{n} reports generated")
 
 class SettlementAgent(Agent):
     """
@@ -331,80 +512,149 @@ class SettlementAgent(Agent):
         msg = Message(self, recipient, msg_type, content)
         recipient.inbox.append(msg)
     def step(self):
-        for report in self.model.positioning_reports:
+        verbose = self.model.logger.verbose
+        log = self.model.logger.log
+        step = self.model.current_step
+        name = self.name
+        send_message = self.send_message
+        reports = self.model.tx_records
+        if not reports:
+            return
+        now = datetime.datetime.now()  # all confirmations of this step share one settlement date
+        confs = [None] * len(reports)  # at most one confirmation per report; trimmed to `settled` below
+        settled = 0
+        for report in reports:
+            tx = report.transaction_id
             payer = report.payer
             deliverer = report.deliverer
-            net_amount = report.net_amount
-            quantity = report.quantity
-            price = net_amount / quantity if quantity else 0
-            adjusted = False
-            if not payer.cash_account.check_balance(net_amount):
-                allowed_cash = payer.cash_account.balance - payer.cash_account.min_balance
-                if allowed_cash <= 0:
-                    self.model.logger.log(self.model.current_step, self.name, "SettlementSkipped", report.transaction_id, f"{payer.name} insufficient cash")
-                    continue
-                net_amount = allowed_cash
-                quantity = int(net_amount / price)
-                adjusted = True
-            if not deliverer.security_account.check_balance(quantity):
-                allowed_qty = deliverer.security_account.balance - deliverer.security_account.min_balance
-                if allowed_qty <= 0:
-                    self.model.logger.log(self.model.current_step, self.name, "SettlementSkipped", report.transaction_id, f"{deliverer.name} insufficient securities")
-                    continue
-                quantity = allowed_qty
-                net_amount = quantity * price
-                adjusted = True
-            if payer.cash_account.withdraw(net_amount):
+            payer_cash = payer.cash_account
+            deliverer_securities = deliverer.security_account
+            net_amount, quantity, adjusted, skip = cap_settlement(report.net_amount, report.quantity,
+                                                                  payer_cash, deliverer_securities)
+            if skip == SKIP_CASH:
+                if verbose:
+                    log(step, name, "SettlementSkipped", tx, f"{payer.name} insufficient cash")
+                continue
+            if skip == SKIP_SECURITIES:
+                if verbose:
+                    log(step, name, "SettlementSkipped", tx, f"{deliverer.name} insufficient securities")
+                continue
+            if payer_cash.withdraw(net_amount):
                 payer.security_account.deposit(quantity)
             else:
-                self.model.logger.log(self.model.current_step, self.name, "SettlementFailed", report.transaction_id, f"Unable to withdraw from {payer.name}")
+                if verbose:
+                    log(step, name, "SettlementFailed", tx, f"Unable to withdraw from {payer.name}")
                 continue
             deliverer.cash_account.deposit(net_amount)
-            if not deliverer.security_account.withdraw(quantity):
-                self.model.logger.log(self.model.current_step, self.name, "SettlementFailed", report.transaction_id, f"Unable to withdraw securities from {deliverer.name}")
+            if not deliverer_securities.withdraw(quantity):
+                if verbose:
+                    log(step, name, "SettlementFailed", tx, f"Unable to withdraw securities from {deliverer.name}")
                 continue
             settlement_status = "Partial" if adjusted else "Full"
-            confirmation = SettlementConfirmation(report.transaction_id, settlement_status, datetime.datetime.now(), quantity, net_amount)
-            self.model.settlement_confirmations.append(confirmation)
-            self.send_message(payer, "settlement_confirmation", {"transaction_id": report.transaction_id, "settlement_status": settlement_status})
-            self.send_message(deliverer, "settlement_confirmation", {"transaction_id": report.transaction_id, "settlement_status": settlement_status})
-            self.model.logger.log(self.model.current_step, self.name, "SettledTransaction", report.transaction_id, f"{settlement_status}: Qty {quantity}, Net {net_amount}")
-        count = len(self.model.positioning_reports)
-        self.model.positioning_reports = []
+            report.status = settlement_status
+            report.timestamp = now
+            report.quantity = quantity
+            report.net_amount = net_amount
+            confs[settled] = report
+            settled += 1
+            send_message(payer, "settlement_confirmation", {"transaction_id": tx, "settlement_status": settlement_status})
+            send_message(deliverer, "settlement_confirmation", {"transaction_id": tx, "settlement_status": settlement_status})
+            if verbose:
+                log(step, name, "SettledTransaction", tx, f"{settlement_status}: Qty {quantity}, Net {net_amount}")
+        self.model.settlement_confirmations += confs[:settled]
+        self.model.tx_records = []
 
 # --- The Model ---
 class SettlementModel(Model):
-    def __init__(self, total_steps=50):
-        self.schedule = RandomActivation(self)
+    def __init__(self, total_steps=50, log_level=Logger.VERBOSE, log_path="simulation_log.csv"):
         self.current_step = 0
         self.total_steps = total_steps
-        self.logger = Logger()
+        self.logger = Logger(log_level, log_path)
         self.institutions = []
         for i in range(4):
             agent = InstitutionAgent(i+1, f"Institution_{i+1}", self)
             self.institutions.append(agent)
-            self.schedule.add(agent)
         self.validation_agent = ValidationAgent(101, "ValidationAgent", self)
         self.matching_agent = MatchingAgent(102, "MatchingAgent", self)
         self.clearing_agent = ClearingAgent(103, "ClearingAgent", self)
-        self.positioning_agent = PositioningAgent(104, "PositioningAgent", self)
         self.settlement_agent = SettlementAgent(105, "SettlementAgent", self)
-        self.schedule.add(self.validation_agent)
-        self.schedule.add(self.matching_agent)
-        self.schedule.add(self.clearing_agent)
-        self.schedule.add(self.positioning_agent)
-        self.schedule.add(self.settlement_agent)
         self.instructions = []
         self.validated_instructions = []
-        self.matched_pairs = {}
-        self.clearing_reports = []
-        self.positioning_reports = []
+        # Instruction columns, one row per live SettlementInstruction (see add_instruction).
+        # Rows and pending_legs slots are handed back by release_instruction and reused.
+        self.instr_tx = np.empty(0, dtype=np.int64)  # row -> pending_legs slot of its transaction
+        self.instr_type = np.empty(0, dtype=np.int8)
+        self.instr_status = np.empty(0, dtype=np.int8)
+        self.instr_qty = np.empty(0, dtype=np.float64)
+        self.instr_price = np.empty(0, dtype=np.float64)
+        self.instr_objs = []  # row -> SettlementInstruction (None for a free row)
+        self.free_rows = []
+        self.tx_numbers = {}  # transaction_id -> pending_legs slot, while any of its legs holds a row
+        self.pending_legs = np.full((0, 2), -1, dtype=np.int64)  # slot -> [payment row, security row]
+        self.slot_legs = np.zeros(0, dtype=np.int8)  # slot -> number of legs holding a row
+        self.free_slots = []
+        self.complete_pairs = {}  # tx -> [Payment, Security] with both legs, waiting for clearing
+        self.tx_records = []  # TxRecords cleared this step, waiting for settlement
         self.settlement_confirmations = []
         self.tx_counter = 1
         self.total_possible_net = 0
 
+    def add_instruction(self, instr):
+        """Give instr a row of the instruction columns (a free one, or a new one after growing them)."""
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.instr_objs[row] = instr
+        else:
+            row = len(self.instr_objs)
+            if row == len(self.instr_tx):
+                grow = max(64, row)
+                self.instr_tx = np.concatenate((self.instr_tx, np.empty(grow, dtype=np.int64)))
+                self.instr_type = np.concatenate((self.instr_type, np.empty(grow, dtype=np.int8)))
+                self.instr_status = np.concatenate((self.instr_status, np.empty(grow, dtype=np.int8)))
+                self.instr_qty = np.concatenate((self.instr_qty, np.empty(grow, dtype=np.float64)))
+                self.instr_price = np.concatenate((self.instr_price, np.empty(grow, dtype=np.float64)))
+            self.instr_objs.append(instr)
+        slot = self.tx_numbers.get(instr.transaction_id)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            else:
+                slot = len(self.tx_numbers)  # no free slot, so every slot handed out is in tx_numbers
+                if slot == len(self.pending_legs):
+                    grow = max(64, slot)
+                    self.pending_legs = np.concatenate((self.pending_legs, np.full((grow, 2), -1, dtype=np.int64)))
+                    self.slot_legs = np.concatenate((self.slot_legs, np.zeros(grow, dtype=np.int8)))
+            self.tx_numbers[instr.transaction_id] = slot
+        self.slot_legs[slot] += 1
+        self.instr_tx[row] = slot
+        self.instr_type[row] = PAYMENT if instr.instruction_type == "Payment" else SECURITY
+        self.instr_status[row] = instr._status
+        self.instr_qty[row] = instr.quantity
+        self.instr_price[row] = instr.price
+        instr.model = self
+        instr.row = row
+
+    def release_instruction(self, instr):
+        """Hand instr's row back once it has left the pipeline (invalid, canceled or cleared).
+
+        The instruction keeps its final status; the transaction's pending_legs slot is freed
+        with its last leg.
+        """
+        row = instr.row
+        instr._status = _STATUSES[self.instr_status[row]]
+        instr.row = -1
+        self.instr_objs[row] = None
+        self.free_rows.append(row)
+        slot = int(self.instr_tx[row])
+        self.slot_legs[slot] -= 1
+        if not self.slot_legs[slot]:
+            self.pending_legs[slot] = -1
+            del self.tx_numbers[instr.transaction_id]
+            self.free_slots.append(slot)
+
     def calculate_settlement_efficiency(self):
-        total_settled = sum(conf.adjusted_net_amount for conf in self.settlement_confirmations)
+        confs = self.settlement_confirmations
+        total_settled = float(np.fromiter((conf.net_amount for conf in confs), dtype=np.float64, count=len(confs)).sum())
         if self.total_possible_net > 0:
             efficiency = (total_settled / self.total_possible_net) * 100
         else:
@@ -414,14 +664,36 @@ class SettlementModel(Model):
     def step(self):
         self.current_step += 1
         self.logger.log(self.current_step, "Model", "StepStart", "", f"Step {self.current_step} begins")
-        self.schedule.step()
+        # Institutions act in random order, then the settlement pipeline runs in its natural order.
+        institutions = self.institutions[:]
+        random.shuffle(institutions)
+        for institution in institutions:
+            institution.step()
+        self.validation_agent.step()
+        self.matching_agent.step()
+        self.clearing_agent.step()
+        self.settlement_agent.step()
 
-if __name__ == "__main__":
-    model = SettlementModel(total_steps=100)
-    for _ in range(model.total_steps):
-        model.step()
-    efficiency = model.calculate_settlement_efficiency()
-    model.logger.log(model.current_step, "Model", "SettlementEfficiency", "", f"Efficiency: {efficiency:.2f}%")
-    model.logger.write_csv("simulation_log.csv")
+def run_once(seed, total_steps=100):
+    """Run one replicate with the given seed, logging to simulation_log_<seed>.csv; returns its efficiency."""
+    random.seed(seed)
+    model = SettlementModel(total_steps=total_steps, log_path=f"simulation_log_{seed}.csv")
+    try:
+        for _ in range(model.total_steps):
+            model.step()
+        efficiency = model.calculate_settlement_efficiency()
+        model.logger.log(model.current_step, "Model", "SettlementEfficiency", "", f"Efficiency: {efficiency:.2f}%")
+        model.logger.write_csv()
+    finally:
+        model.logger.close()  # also when a step fails part-way
+    return efficiency
 
+N_REPLICATES = 8
 
+if __name__ == "__main__":
+    # Replicates are independent, so they run in parallel, one per worker process.
+    with Pool() as pool:
+        efficiencies = pool.map(run_once, range(N_REPLICATES))
+    for seed, efficiency in enumerate(efficiencies):
+        print(f"Replicate {seed}: settlement efficiency {efficiency:.2f}%")
+    print(f"Mean settlement efficiency: {sum(efficiencies) / len(efficiencies):.2f}%")